@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Shared pytest setup. The single-flow scripts get their fixtures from
+claimsimple_flow.py (registered below); hk_eclaims.py overrides `config` and
+`page` with its own.
+
+The hooks below serve the HK eClaims multi-flow run (hk_eclaims.py).
+
+Flows may run on separate pytest-xdist workers (`pytest -n 3 hk_eclaims.py`),
+so each flow writes its result as JSON into one shared results directory
+(next to the run's config, built once; see hk_eclaims.load_shared_config).
+After ALL workers finish, the controller gathers those results and sends ONE
+email with every screenshot inline.
+"""
+
+import os
+import glob
+import json
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest_plugins = ["claimsimple_flow"]
+
+# Set once by the controller; xdist workers inherit it through the environment
+RESULTS_DIR_ENV = "HK_ECLAIMS_RESULTS_DIR"
+
+
+def _is_xdist_worker(config) -> bool:
+    return hasattr(config, "workerinput")
+
+
+def pytest_configure(config):
+    # Workers are spawned after this hook runs on the controller
+    if not _is_xdist_worker(config):
+        os.environ[RESULTS_DIR_ENV] = tempfile.mkdtemp(prefix="hk-eclaims-results-")
+
+
+def pytest_unconfigure(config):
+    # Runs after pytest_sessionfinish has sent the summary email
+    if not _is_xdist_worker(config):
+        results_dir = os.environ.pop(RESULTS_DIR_ENV, None)
+        if results_dir:
+            shutil.rmtree(results_dir, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def results_dir():
+    """Directory shared by the controller and all workers for per-flow JSON results."""
+    return os.environ[RESULTS_DIR_ENV]
+
+
+def load_flow_results(results_dir) -> list:
+    """All persisted flow results, in flow order."""
+    results = []
+    for path in glob.glob(os.path.join(results_dir, "flow_*.json")):
+        with open(path, encoding="utf-8") as f:
+            results.append(json.load(f))
+    results.sort(key=lambda r: r["n"])
+    return results
+
+
+def pytest_sessionfinish(session, exitstatus):
+    """
+    Send the single summary email once every flow has reported
+    (ALWAYS, or only on failure). Runs on the controller only.
+    """
+    if _is_xdist_worker(session.config):
+        return
+
+    results_dir = os.environ.get(RESULTS_DIR_ENV)
+    results = load_flow_results(results_dir) if results_dir else []
+    if not results:
+        return  # hk_eclaims flows were not part of this run
+
+    from email_utils import get_sender
+    from hk_eclaims import build_message_with_multiple_images, load_shared_config
+
+    # The same config the workers ran with (timestamps, paths, email settings)
+    config = load_shared_config(results_dir)
+    any_fail = any(r["status"] == "FAILED" for r in results)
+
+    should_email = config["ALWAYS_EMAIL"] or (any_fail and config["EMAIL_ON_FAILURE"])
+    if not should_email:
+        return
+
+    subject_status = "FAILED" if any_fail else "PASSED"
+    subject = f"{config['SUBJECT_BASE']} [{subject_status}]"
+
+    try:
+        # SMTP vars were validated by build_config
+        smtp_user = config["SMTP_USERNAME"]
+        smtp_pass = config["SMTP_PASSWORD"]
+        to_email  = config["TO_EMAIL"]
+
+        # Open the SMTP session while the screenshots are read and encoded
+        sender = get_sender(smtp_user, smtp_pass, config["USE_SSL_465"])
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            smtp_ready = pool.submit(sender.ensure_connected)
+            msg = build_message_with_multiple_images(
+                from_email=smtp_user,
+                to_email=to_email,
+                subject=subject,
+                text_body=config["TEXT_BODY"],
+                intro_html=config["INTRO_HTML"],
+                sections=results,
+                image_max_px=config["EMAIL_IMG_MAX_PX"],
+                image_quality=config["SCREENSHOT_Q"],
+            )
+            smtp_ready.result()
+        sender.send(msg)
+        print(f"\n✅ Single email sent to {to_email} with {len(results)} inline screenshots.")
+    except Exception as e:
+        # The email IS the health check report; a failed send must fail the run
+        print(f"\n❌ Failed to send summary email: {e}")
+        session.exitstatus = pytest.ExitCode.TESTS_FAILED
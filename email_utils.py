@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+"""
+Email / env utilities shared by the ClaimSimple HK health checks.
+
+- REQUIRED_VARS / require_env / get_env: SMTP settings that must be present to send
+- build_message_with_inline_image: one screenshot inline (CID) in an HTML mail
+- SmtpSender / send_via_gmail_smtp: Gmail SMTP over one reused connection
+- _pillow / screenshot_type / DEFAULT_JPEG_QUALITY: optional screenshot re-encoding
+
+Author: MJ
+"""
+
+from __future__ import annotations
+
+import io
+import os
+import atexit
+import functools
+import itertools
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from email.message import EmailMessage
+
+# ssl/smtplib/email/Pillow are imported inside the email path only, so test
+# collection and runs that never send mail don't pay for them.
+
+REQUIRED_VARS = ["SMTP_USERNAME", "SMTP_PASSWORD", "TO_EMAIL"]
+
+
+def require_env(env=None) -> dict:
+    """
+    REQUIRED_VARS from env (default os.environ), checked together so a
+    misconfigured run fails at startup; the error lists every missing one.
+    """
+    env = os.environ if env is None else env
+    vals = {k: env.get(k) for k in REQUIRED_VARS}
+    missing = [k for k, v in vals.items() if not v]
+    if missing:
+        raise RuntimeError(f"Missing required environment variable(s): {', '.join(missing)}")
+    return vals
+
+
+def get_env(name: str) -> str:
+    val = os.getenv(name)
+    if not val:
+        raise RuntimeError(f"Missing required environment variable: {name}")
+    return val
+
+
+# Static HTML shell, pre-split around the two per-email slots (intro, CID) so
+# building the body is a single join, with no template parsing per call
+_HTML_HEAD, _HTML_MID, _HTML_TAIL = (
+    """
+    <html>
+      <body style="font-family:Segoe UI, Arial, sans-serif;">
+        <p>""",
+    """</p>
+        <p>
+          <img src="cid:""",
+    """" alt="Screenshot"
+               style="max-width:100%; height:auto; border:1px solid #ddd;"/>
+        </p>
+      </body>
+    </html>
+    """,
+)
+
+# Inline-image Content-IDs only need to be unique within a message
+_cid_counter = itertools.count()
+
+
+@functools.lru_cache(maxsize=1)
+def _pillow():
+    """Pillow's Image module, imported on first use; None if not installed (optional)."""
+    try:
+        from PIL import Image
+    except Exception:
+        return None
+    return Image
+
+
+def screenshot_type(path: str) -> str:
+    """Image subtype implied by the screenshot path: "jpeg" for .jpg/.jpeg, else "png"."""
+    return "jpeg" if path.lower().endswith((".jpg", ".jpeg")) else "png"
+
+
+# JPEG quality for screenshots and their downscaled copies when the caller
+# passes none (the scripts pass their SCREENSHOT_Q config)
+DEFAULT_JPEG_QUALITY = 85
+
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _downscale(src, max_px: int, image_subtype: str = "png",
+               quality: int = DEFAULT_JPEG_QUALITY) -> bytes | None:
+    """
+    Image src (path or file object) downscaled to at most max_px wide and
+    re-saved in the same format (optimized PNG / JPEG at quality). None when
+    it is already narrow enough, max_px is 0 or Pillow is unavailable.
+    """
+    Image = _pillow()
+    if not max_px or Image is None:
+        return None
+    with Image.open(src) as img:
+        if img.width <= max_px:
+            return None
+        # Bound the width only: full-page grabs are tall and must stay legible
+        img.thumbnail((max_px, img.height))
+        buf = io.BytesIO()
+        if image_subtype == "jpeg":
+            img.convert("RGB").save(buf, "JPEG", quality=quality, optimize=True, progressive=True)
+        else:
+            img.save(buf, "PNG", optimize=True)
+    return buf.getvalue()
+
+
+@functools.lru_cache(maxsize=8)
+def _load_image(path: str, mtime_ns: int, max_px: int = 0, image_subtype: str = "png",
+                quality: int = DEFAULT_JPEG_QUALITY) -> bytes:
+    """
+    Screenshot bytes, downscaled as in _downscale (0 = send as captured).
+    mtime_ns is part of the key so a rewritten file is re-read.
+    """
+    # Pillow reads the file itself; the original is only loaded if sent as-is
+    return _downscale(path, max_px, image_subtype, quality) or _read_bytes(path)
+
+
+def build_message_with_inline_image(
+    from_email: str,
+    to_email: str,
+    subject: str,
+    text_body: str,
+    html_intro: str,
+    image_path: str,
+    image_subtype: str = "png",
+    max_px: int = 0,
+    image_bytes: bytes | None = None,
+    jpeg_quality: int = DEFAULT_JPEG_QUALITY,
+) -> EmailMessage:
+    """
+    Creates a multipart/alternative + related email:
+      - text/plain part
+      - text/html part referencing inline image via CID
+    image_subtype is "png" or "jpeg" (see screenshot_type); max_px > 0
+    downscales the screenshot to that width (needs Pillow), re-encoding a
+    JPEG at jpeg_quality.
+    image_bytes: the screenshot as captured in memory (page.screenshot()
+    without a path); image_path then only names the attachment.
+    """
+    from email.message import EmailMessage
+
+    if image_bytes is None:
+        image_bytes = _load_image(image_path, os.stat(image_path).st_mtime_ns, max_px, image_subtype,
+                                  jpeg_quality)
+    else:
+        image_bytes = _downscale(io.BytesIO(image_bytes), max_px, image_subtype, jpeg_quality) or image_bytes
+
+    msg = EmailMessage()
+    msg["From"] = from_email
+    msg["To"] = to_email
+    msg["Subject"] = subject
+
+    # Plain text fallback
+    msg.set_content(text_body)
+
+    # Generate a CID for the image (unique per process; no getfqdn/urandom)
+    cid = f"<{os.getpid()}.{next(_cid_counter)}@inline>"
+    cid_no_brackets = cid[1:-1]        # strip < >
+
+    # Proper HTML with an inline image referencing the CID
+    html_body = "".join((_HTML_HEAD, html_intro, _HTML_MID, cid_no_brackets, _HTML_TAIL))
+
+    # Add HTML alternative
+    msg.add_alternative(html_body, subtype="html")
+
+    # Attach the image as a related part to the HTML
+    html_part = msg.get_body(preferencelist=("html",))
+    html_part.add_related(
+        image_bytes,
+        maintype="image",
+        subtype=image_subtype,
+        cid=cid,
+        filename=os.path.basename(image_path),
+    )
+
+    return msg
+
+
+@functools.lru_cache(maxsize=1)
+def _ssl_context():
+    """
+    Default TLS client context, built (CA bundle loaded) once and shared by
+    every SMTP connection; ssl is still only imported on first use.
+    """
+    import ssl
+    return ssl.create_default_context()
+
+
+class SmtpSender:
+    """
+    Gmail SMTP client that keeps ONE authenticated connection open and reuses it
+    for every send in the session (retries, batched reports).
+    - Default: STARTTLS on 587
+    - Optionally: implicit SSL on 465
+    - NOOP health check before each send; lazy reconnect if the server dropped us
+    - Reconnects after `max_messages` sends so a single session isn't held forever
+    """
+
+    SMTP_SERVER = "smtp.gmail.com"
+
+    def __init__(self, username: str, password: str, use_port_465=False, max_messages: int = 50):
+        self.username = username
+        self.password = password
+        self.use_port_465 = use_port_465
+        self.max_messages = max_messages
+        self._server = None
+        self._sent_on_connection = 0
+        self._fresh = False  # connected and not yet used: no NOOP needed
+
+    def __enter__(self):
+        self._connect()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.quit()
+
+    def _connect(self):
+        import smtplib
+        if self.use_port_465:
+            server = smtplib.SMTP_SSL(self.SMTP_SERVER, 465, context=_ssl_context(), timeout=60)
+        else:
+            server = smtplib.SMTP(self.SMTP_SERVER, 587, timeout=60)
+            server.ehlo()
+            server.starttls(context=_ssl_context())
+            server.ehlo()
+        server.login(self.username, self.password)
+        self._server = server
+        self._sent_on_connection = 0
+        self._fresh = True
+
+    def _is_alive(self) -> bool:
+        if self._server is None:
+            return False
+        try:
+            return self._server.noop()[0] == 250
+        except Exception:
+            return False
+
+    def ensure_connected(self):
+        """
+        Make sure a live, non-exhausted connection is open (connect/reconnect
+        if not). Safe to run on a worker thread ahead of send().
+        """
+        if self._fresh:
+            return
+        if self._sent_on_connection >= self.max_messages or not self._is_alive():
+            self.quit()
+            self._connect()
+
+    def send(self, msg: EmailMessage):
+        """Send on the cached connection, (re)connecting only when needed."""
+        import smtplib
+        self.ensure_connected()
+        try:
+            self._server.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # Dropped between NOOP and send: reconnect once and retry
+            self._connect()
+            self._server.send_message(msg)
+        self._sent_on_connection += 1
+        self._fresh = False
+
+    def quit(self):
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except Exception:
+            pass
+        finally:
+            self._server = None
+            self._fresh = False
+
+
+# Module-level senders for send_via_gmail_smtp, keyed by (username, use_port_465)
+_SMTP_SINGLETONS = {}
+
+
+def _close_smtp_singletons():
+    while _SMTP_SINGLETONS:
+        _, sender = _SMTP_SINGLETONS.popitem()
+        sender.quit()
+
+
+atexit.register(_close_smtp_singletons)
+
+
+def get_sender(username: str, password: str, use_port_465=False, max_messages: int = 50) -> SmtpSender:
+    """
+    The process-wide SmtpSender for (username, use_port_465), created on first
+    use (or when the password changed). Call .ensure_connected() on it to open
+    the session ahead of the send; all are QUIT at interpreter exit.
+    max_messages only applies when the sender is created.
+    """
+    key = (username, use_port_465)
+    sender = _SMTP_SINGLETONS.get(key)
+    if sender is None or sender.password != password:
+        if sender is not None:
+            sender.quit()
+        sender = _SMTP_SINGLETONS[key] = SmtpSender(
+            username, password, use_port_465=use_port_465, max_messages=max_messages
+        )
+    return sender
+
+
+def send_via_gmail_smtp(msg: EmailMessage, username: str, password: str, use_port_465=False):
+    """
+    Send through the process-wide SmtpSender (see get_sender), so repeated
+    calls reuse one authenticated connection (NOOP-checked, reconnected if
+    dropped).
+    """
+    get_sender(username, password, use_port_465).send(msg)
@@ -15,21 +15,39 @@ Each flow:
   - Verifies error text appears
   - Takes a screenshot
 
-Finally:
+Each flow is its own parametrized test, so `pytest -n 3` (pytest-xdist) runs
+them concurrently; every flow persists a JSON result next to its screenshot.
+
+Finally (conftest.py, once on the controller):
   - Sends ONE email with three inline images + per-flow status
-  - Fails pytest if ANY flow failed (after sending the email)
+  - Each failed flow fails its own test
 """
 
+from __future__ import annotations
+
+import io
 import os
-import ssl
-import time
-import html
+import json
+import string
 from datetime import datetime
-from email.message import EmailMessage
-from email.utils import make_msgid
+from concurrent.futures import ThreadPoolExecutor
 
 import pytest
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeout
+from playwright.sync_api import sync_playwright
+
+from email_utils import DEFAULT_JPEG_QUALITY, _pillow, require_env, screenshot_type
+# Flow helpers and runner shared with the single-flow scripts
+from claimsimple_flow import (
+    CHROMIUM_ARGS,
+    PAGE_HELPERS_JS,
+    _env_flag,
+    _env_int,
+    compile_url_hint,
+    make_third_party_blocker,
+    normalize_text,
+    run_claimsimple_flow_playwright,
+    stable_screenshot,
+)
 
 # Optional .env support
 try:
@@ -39,45 +57,115 @@ except Exception:
     pass
 
 # -----------------------------------------------------------------------------
-# Email / Env Utilities
+# Email (multi-image message; env + SMTP helpers live in email_utils)
+# (email.* and html are imported on first use: a run that never emails never
+#  pays for them)
 # -----------------------------------------------------------------------------
-REQUIRED_VARS = ["SMTP_USERNAME", "SMTP_PASSWORD", "TO_EMAIL"]
+def _recompress(img_path, max_px: int, quality: int = DEFAULT_JPEG_QUALITY):
+    """
+    (bytes, subtype) of a screenshot downscaled to at most max_px wide:
+    JPEG at quality when opaque, optimized PNG when transparency matters.
+    None when it is already narrow enough (sent as captured, no re-encode).
+    """
+    Image = _pillow()
+    # Pillow reads the file itself; the original never sits in memory as bytes
+    with Image.open(img_path) as img:
+        if img.width <= max_px:
+            return None
+        # Bound the width only: full-page grabs are tall and must stay legible
+        img.thumbnail((max_px, img.height), Image.LANCZOS)
+        buf = io.BytesIO()
+        has_alpha = img.mode in ("RGBA", "LA") or "transparency" in img.info
+        if has_alpha and img.convert("RGBA").getextrema()[3][0] < 255:
+            img.save(buf, "PNG", optimize=True)
+            return buf.getvalue(), "png"
+        img.convert("RGB").save(buf, "JPEG", quality=quality, optimize=True, progressive=True)
+    return buf.getvalue(), "jpeg"
+
+
+def _read_image(img_path, subtype: str = "png", max_px: int = 0, quality: int = DEFAULT_JPEG_QUALITY):
+    """
+    (bytes, subtype) of an inline image, or None if there is no such file.
+    max_px > 0 re-encodes a wider one smaller when Pillow is available;
+    otherwise the file's bytes are sent as is (add_related base64-encodes them right away,
+    so the file is closed before the message is built).
+    """
+    if not isinstance(img_path, (str, os.PathLike)) or not os.path.isfile(img_path):
+        return None
+    if max_px and _pillow() is not None:
+        recompressed = _recompress(img_path, max_px, quality)
+        if recompressed is not None:
+            return recompressed
+    with open(img_path, "rb") as f:
+        return f.read(), subtype
+
+
+# HTML shell + per-flow section of the summary email ($-placeholders, see _section_fields)
+EMAIL_SHELL_TMPL = string.Template("""
+    <html>
+      <body style="font-family:Segoe UI, Arial, sans-serif;">
+        <div style="font-family:Segoe UI,Arial,sans-serif; font-size:14px; line-height:1.5; color:#222; margin:0 0 12px;">
+          $intro_html
+        </div>
+        $sections
+      </body>
+    </html>
+    """)
 
+SECTION_TMPL = string.Template("""
+        <section style="margin:14px 0; padding-bottom:12px; border-bottom:1px solid #e8e8e8;">
+          <h3 style="font-family:Segoe UI,Arial,sans-serif; margin:0 0 8px;">
+            $title — <span style="color:$status_color">$status</span>
+          </h3>
+          <div style="font-family:Segoe UI,Arial,sans-serif; font-size:14px; line-height:1.5; color:#222;">
+            $intro
+            $err_block
+            $fail_block
+          </div>
+          <div style="margin-top:8px;">
+            <img src="cid:$cid" alt="Screenshot - $title"
+                 style="max-width:100%; height:auto; border:1px solid #ddd; border-radius:4px;" />
+          </div>
+        </section>
+        """)
 
-def get_env(name: str) -> str:
-    val = os.getenv(name)
-    if not val:
-        missing = [v for v in REQUIRED_VARS if not os.getenv(v)]
-        raise RuntimeError(
-            f"Missing required environment variable: {name}\n"
-            f"Currently missing: {', '.join(missing)}"
-        )
-    return val
+
+def prepare_section(result: dict) -> dict:
+    """
+    Add the HTML-ready fields _section_fields() slots in directly:
+    title_h / observed_error_h / failure_reason_h (escaped) and
+    html_intro_ready (entities unescaped). Raw fields are kept.
+    """
+    import html
+    result["title_h"] = html.escape(result["title"])
+    result["observed_error_h"] = html.escape(result.get("observed_error") or "")
+    result["failure_reason_h"] = html.escape(result.get("failure_reason") or "")
+    result["html_intro_ready"] = html.unescape(result.get("html_intro") or "")
+    return result
 
 
-def send_via_gmail_smtp(msg: EmailMessage, username: str, password: str, use_port_465=False):
+def _section_fields(idx: int, s: dict, cid: str) -> dict:
     """
-    Sends the message via Gmail SMTP.
-    - Default: STARTTLS on 587
-    - Optionally: implicit SSL on 465
+    SECTION_TMPL substitutions for one flow result. Pre-escaped fields
+    (see prepare_section) are slotted in as is; raw ones are escaped here.
     """
-    smtp_server = "smtp.gmail.com"
-    if use_port_465:
-        port = 465
-        context = ssl.create_default_context()
-        import smtplib
-        with smtplib.SMTP_SSL(smtp_server, port, context=context, timeout=60) as server:
-            server.login(username, password)
-            server.send_message(msg)
-    else:
-        port = 587
-        import smtplib
-        with smtplib.SMTP(smtp_server, port, timeout=60) as server:
-            server.ehlo()
-            server.starttls(context=ssl.create_default_context())
-            server.ehlo()
-            server.login(username, password)
-            server.send_message(msg)
+    import html
+
+    def ready(key, raw_key, convert):
+        return s[key] if key in s else convert(s.get(raw_key) or "")
+
+    status = html.escape(s.get("status", "UNKNOWN"))
+    observed_error = ready("observed_error_h", "observed_error", html.escape)
+    failure_reason = ready("failure_reason_h", "failure_reason", html.escape)
+    return {
+        "title": s["title_h"] if "title_h" in s else html.escape(s.get("title", f"Flow {idx}")),
+        "status": status,
+        "status_color": "#1a7f37" if status == "PASSED" else "#d92d20",
+        "intro": ready("html_intro_ready", "html_intro", html.unescape),  # turn &lt;br/&gt; into <br/>
+        "err_block": f"<p><strong>Observed error:</strong> {observed_error}</p>" if observed_error else "",
+        "fail_block": f"<p><strong>Failure reason:</strong> {failure_reason}</p>" if failure_reason else "",
+        "cid": cid,
+    }
 
 
 def build_message_with_multiple_images(
@@ -88,9 +176,13 @@ def build_message_with_multiple_images(
     text_body: str,
     intro_html: str,
     sections: list,
+    image_max_px: int = 0,
+    image_quality: int = DEFAULT_JPEG_QUALITY,
 ):
     """
     Creates an email with a single HTML body and multiple inline images.
+    image_max_px > 0 downscales/re-encodes each image first (needs Pillow),
+    JPEG at image_quality.
     sections: list of dicts with keys:
         - title (str)
         - html_intro (str)  # may contain HTML entities (we unescape)
@@ -99,7 +191,11 @@ def build_message_with_multiple_images(
         - observed_error (str|None)
         - failure_reason (str|None)
         - status (str): 'PASSED'|'FAILED'
+        optionally with prepare_section()'s pre-escaped fields
     """
+    import html
+    from email.message import EmailMessage
+
     msg = EmailMessage()
     msg["From"] = from_email
     msg["To"] = to_email
@@ -109,413 +205,144 @@ def build_message_with_multiple_images(
     msg.set_content(text_body)
 
     # Build HTML with a global intro and one <section> per flow, each containing an <img src="cid:...">
-    intro_html = html.unescape(intro_html or "")
-    html_parts = [f"""
-      <div style="font-family:Segoe UI,Arial,sans-serif; font-size:14px; line-height:1.5; color:#222; margin:0 0 12px;">
-        {intro_html}
-      </div>
-    """]
-
-    cid_pairs = []  # list[(cid, section_dict)]
-    for idx, s in enumerate(sections, start=1):
-        cid = make_msgid(domain="inline")          # e.g. "<random@inline>"
-        cid_no_brackets = cid[1:-1]                # strip < >
-        cid_pairs.append((cid, s))
-
-        title = html.escape(s.get("title", f"Flow {idx}"))
-        intro = html.unescape(s.get("html_intro") or "")  # turn &lt;br/&gt; into <br/>
-        status = html.escape(s.get("status", "UNKNOWN"))
-        observed_error = html.escape(s.get("observed_error") or "")
-        failure_reason = html.escape(s.get("failure_reason") or "")
-
-        block = f"""
-        <section style="margin:14px 0; padding-bottom:12px; border-bottom:1px solid #e8e8e8;">
-          <h3 style="font-family:Segoe UI,Arial,sans-serif; margin:0 0 8px;">
-            {title} — <span style="color:{'#1a7f37' if status=='PASSED' else '#d92d20'}">{status}</span>
-          </h3>
-          <div style="font-family:Segoe UI,Arial,sans-serif; font-size:14px; line-height:1.5; color:#222;">
-            {intro}
-            {"<p><strong>Observed error:</strong> " + observed_error + "</p>" if observed_error else ""}
-            {"<p><strong>Failure reason:</strong> " + failure_reason + "</p>" if failure_reason else ""}
-          </div>
-          <div style="margin-top:8px;">
-            <img src="cid:{cid_no_brackets}" alt="Screenshot - {title}"
-                 style="max-width:100%; height:auto; border:1px solid #ddd; border-radius:4px;" />
-          </div>
-        </section>
-        """
-        html_parts.append(block)
-
-    full_html = f"""
-    <html>
-      <body style="font-family:Segoe UI, Arial, sans-serif;">
-        {''.join(html_parts)}
-      </body>
-    </html>
-    """
+    # Content-IDs only need to be unique within this message: no make_msgid
+    # (getfqdn/random) per image
+    cid_pairs = [(f"<shot{idx}@inline>", s) for idx, s in enumerate(sections, start=1)]
+    full_html = EMAIL_SHELL_TMPL.substitute(
+        intro_html=html.unescape(intro_html or ""),
+        sections="".join(
+            SECTION_TMPL.substitute(_section_fields(idx, s, cid[1:-1]))  # strip < >
+            for idx, (cid, s) in enumerate(cid_pairs, start=1)
+        ),
+    )
     msg.add_alternative(full_html, subtype="html")
 
     # Attach each image as "related" to the HTML body and mark as inline
     html_part = msg.get_body(preferencelist=("html",))
-    for cid, s in cid_pairs:
-        img_path = s.get("image_path")
-        subtype = s.get("image_subtype", "png")
-        if img_path and os.path.exists(img_path):
-            with open(img_path, "rb") as f:
-                related = html_part.add_related(
-                    f.read(),
-                    maintype="image",
-                    subtype=subtype,
-                    cid=cid,  # sets Content-ID
-                    filename=os.path.basename(img_path),
-                )
-                # Encourage inline rendering (helps Outlook)
-                try:
-                    related.add_header("Content-Disposition", f'inline; filename="{os.path.basename(img_path)}"')
-                except Exception:
-                    pass
-    return msg
-
-
-# -----------------------------------------------------------------------------
-# Playwright Selectors (shared) + Helpers
-# -----------------------------------------------------------------------------
-CHECKBOX_INPUT = 'input.ui-checkbox__input[name="terms"]'
-ID_TOGGLE_ICON = ".ui-selection__symbol"
-ID_INPUT = ".qna__input"                 # First .qna__input = ID field in the flow
-DOB_NAME_SELECTOR = "input[name='dob']"  # name-based selector
-ERROR_TEXT_CSS = ".error-tip-text"
-
-
-def set_input_value_js(page, css_selector: str, value: str):
-    """Set value via JS and dispatch input/change so frameworks commit state."""
-    page.wait_for_selector(css_selector, state="attached", timeout=30000)
-    page.evaluate(
-        """([sel, val]) => {
-            const el = document.querySelector(sel);
-            if (!el) throw new Error('Element not found for selector: ' + sel);
-            try { el.focus(); } catch (e) {}
-            const nativeDescriptor = Object.getOwnPropertyDescriptor(window.HTMLInputElement.prototype, 'value');
-            if (nativeDescriptor && nativeDescriptor.set) {
-                nativeDescriptor.set.call(el, val);
-            } else {
-                el.value = val;
-            }
-            el.dispatchEvent(new Event('input', { bubbles: true }));
-            el.dispatchEvent(new Event('change', { bubbles: true }));
-        }""",
-        [css_selector, value],
-    )
-
-
-def commit_and_press_enter(locator):
-    """Commit value (input/change/blur) then send Enter key."""
-    try:
-        locator.dispatch_event("input")
-        locator.dispatch_event("change")
-        locator.dispatch_event("blur")
-    except Exception:
-        pass
-    try:
-        locator.press("Enter")
-    except Exception:
-        pass
-
-
-def wait_for_verify_response_if_any(page, url_hint: str | None, timeout_ms: int = 10000):
-    """
-    If the app calls a verify/validate endpoint, wait it out (non-fatal).
-    url_hint may be a '|' pipe-separated set of substrings.
-    """
-    if not url_hint:
-        url_hint = "verify|validate"
-    tokens = [t.strip().lower() for t in url_hint.split("|") if t.strip()]
-
-    def _matcher(r):
-        u = r.url.lower()
-        return any(tok in u for tok in tokens) and r.request.method in ("GET", "POST")
-
-    try:
-        page.wait_for_response(_matcher, timeout=timeout_ms)
-    except Exception:
-        pass
-
-
-def wait_until_painted(page, locator, timeout_ms: int = 5000):
-    """Ensure the element is visible, painted, non-zero size; flush two rAFs."""
-    locator.scroll_into_view_if_needed()
-    handle = locator.element_handle(timeout=timeout_ms)
-    if not handle:
-        return
-    page.wait_for_function(
-        """(el) => {
-            if (!el || !el.isConnected) return false;
-            const s = getComputedStyle(el);
-            const painted = el.offsetParent !== null
-                && el.offsetHeight > 0 && el.offsetWidth > 0
-                && s.visibility !== 'hidden'
-                && s.display !== 'none'
-                && parseFloat(s.opacity || '1') > 0.01;
-            return painted;
-        }""",
-        arg=handle,
-        timeout=timeout_ms
-    )
-    page.evaluate("""() => new Promise(r => requestAnimationFrame(() => requestAnimationFrame(r)))""")
-
-
-def stable_screenshot(page, path, retries: int = 3, delay_ms: int = 400, full_page: bool = True):
-    """Screenshot with small retry loop to avoid paint races."""
-    try:
-        d = os.path.dirname(path)
-        if d:
-            os.makedirs(d, exist_ok=True)
-    except Exception:
-        pass
-
-    for _ in range(retries):
-        try:
-            page.screenshot(path=path, full_page=full_page)
-            return
-        except Exception:
-            pass
-        page.wait_for_timeout(delay_ms)
-    page.screenshot(path=path, full_page=full_page)
-
-
-# -----------------------------------------------------------------------------
-# Main single-flow runner (parameterized by selectors & URLs)
-# -----------------------------------------------------------------------------
-def run_claimsimple_flow_playwright(
-    page, *,
-    cs_hk_url,
-    tnc_emc_url,
-    claim_id,
-    claim_dob,
-    expected_error_text,
-    screenshot_path,
-    claim_btn_selector,
-    continue_btn_selector,
-    post_assert_delay_ms: int = 1000,
-    verify_url_hint: str | None = None,
-) -> str:
-    """
-    Runs ONE flow and takes a screenshot at the end.
-    Returns the observed error text (if found).
-    """
-    observed_error_text = ""
-
-    # Navigate to splash (tolerate SPA redirects)
-    page.goto(cs_hk_url, wait_until="domcontentloaded")
-
-    # 1) Click the flow-specific Claim button
-    page.wait_for_selector(claim_btn_selector, state="visible", timeout=30000)
-    page.locator(claim_btn_selector).scroll_into_view_if_needed()
-    page.locator(claim_btn_selector).click()
-    print(f"Clicked flow button: {claim_btn_selector}")
-
-    # 2) Wait for checkbox; if not, route directly to T&C and retry
-    try:
-        page.wait_for_selector(CHECKBOX_INPUT, state="visible", timeout=20000)
-    except Exception:
-        print("Checkbox not visible after click; attempting direct hash-route and retry.")
-        page.evaluate(f"location.href = '{tnc_emc_url}'")
-        page.wait_for_selector(CHECKBOX_INPUT, state="visible", timeout=30000)
-
-    # 3) Accept T&Cs
-    page.locator(CHECKBOX_INPUT).scroll_into_view_if_needed()
-    page.locator(CHECKBOX_INPUT).check(force=True)
-    print("Checkbox clicked.")
-
-    # 4) Continue (flow-specific button)
-    page.wait_for_selector(continue_btn_selector, state="visible", timeout=30000)
-    page.locator(continue_btn_selector).scroll_into_view_if_needed()
-    page.locator(continue_btn_selector).click()
-    print("Clicked Continue.")
-
-    # 5) Switch to ID option
-    page.wait_for_selector(ID_TOGGLE_ICON, state="visible", timeout=30000)
-    page.locator(ID_TOGGLE_ICON).first.scroll_into_view_if_needed()
-    page.locator(ID_TOGGLE_ICON).first.click()
-    print("Switched to ID entry.")
-
-    # 6) Enter ID
-    page.wait_for_selector(ID_INPUT, state="visible", timeout=30000)
-    id_box = page.locator(ID_INPUT).first
-    id_box.scroll_into_view_if_needed()
-    id_box.click()
-    id_box.fill("")
-    id_box.fill(claim_id)
-    commit_and_press_enter(id_box)
-    print("Entered ID.")
-    time.sleep(0.4)
-
-    # 7) Enter DOB by name='dob' with fallback to JS
-    page.wait_for_selector(DOB_NAME_SELECTOR, state="attached", timeout=30000)
-    dob_box = page.locator(DOB_NAME_SELECTOR).first
-
-    native_dob_ok = True
-    try:
-        try:
-            dob_box.scroll_into_view_if_needed()
-        except Exception:
-            pass
-        dob_box.click(timeout=1000)
-        dob_box.fill("")
-        dob_box.type(claim_dob, delay=18)
-        commit_and_press_enter(dob_box)
-        print("Entered DOB via native typing.")
-    except Exception as e:
-        native_dob_ok = False
-        print(f"Native DOB typing failed; fallback to JS. Reason: {e}")
-
-    if not native_dob_ok:
-        set_input_value_js(page, DOB_NAME_SELECTOR, claim_dob)
-        try:
-            try:
-                dob_box.evaluate("el => el.focus()")
-            except Exception:
-                pass
-            commit_and_press_enter(dob_box)
-            print("Entered DOB via JS setter + Enter.")
-        except Exception:
-            # Absolute last resort: dispatch Enter at document level
-            page.evaluate(
-                """() => {
-                    const opts = { key: 'Enter', code: 'Enter', keyCode: 13, which: 13, bubbles: true };
-                    document.dispatchEvent(new KeyboardEvent('keydown', opts));
-                    document.dispatchEvent(new KeyboardEvent('keypress', opts));
-                    document.dispatchEvent(new KeyboardEvent('keyup', opts));
-                }"""
-            )
-            print("Entered DOB via JS; dispatched Enter at document level.")
-
-    # 8) Wait for potential error message to render
-    try:
-        err = page.wait_for_selector(ERROR_TEXT_CSS, state="visible", timeout=30000)
-        observed_error_text = (err.inner_text() or "").strip()
-        print("Observed error text:", observed_error_text)
-    except PlaywrightTimeout:
-        print("No error message element found within timeout.")
-
-    # 9) Assert text + visually stabilize before screenshot
-    if expected_error_text:
-        expected_norm = expected_error_text.strip().casefold()
-        actual_norm = observed_error_text.strip().casefold()
-        assert expected_norm in actual_norm or actual_norm in expected_norm, (
-            "Error - Expected text not found.\n"
-            f"Expected (contains/equals): {expected_error_text}\n"
-            f"Actual:                     {observed_error_text}"
+    # Read all screenshots concurrently (disk I/O releases the GIL)
+    with ThreadPoolExecutor(max_workers=max(1, len(cid_pairs))) as ex:
+        images = list(ex.map(
+            lambda s: _read_image(s.get("image_path"), s.get("image_subtype", "png"), image_max_px, image_quality),
+            [s for _, s in cid_pairs],
+        ))
+
+    for (cid, s), image in zip(cid_pairs, images):
+        if image is None:
+            continue
+        data, subtype = image
+        filename = os.path.basename(s["image_path"])
+        if subtype == "jpeg":
+            filename = os.path.splitext(filename)[0] + ".jpg"
+        related = html_part.add_related(
+            data,
+            maintype="image",
+            subtype=subtype,
+            cid=cid,  # sets Content-ID
+            filename=filename,
         )
-
-        # Commit validation + wait for network verify/validate if any
+        # Encourage inline rendering (helps Outlook)
         try:
-            id_box.dispatch_event("input")
-            id_box.dispatch_event("change")
-            id_box.dispatch_event("blur")
-            dob_box.dispatch_event("input")
-            dob_box.dispatch_event("change")
-            dob_box.dispatch_event("blur")
+            related.add_header("Content-Disposition", f'inline; filename="{filename}"')
         except Exception:
             pass
-        try:
-            page.evaluate("document.activeElement && document.activeElement.blur && document.activeElement.blur();")
-        except Exception:
-            pass
-        try:
-            page.keyboard.press("Enter")
-        except Exception:
-            pass
-
-        wait_for_verify_response_if_any(page, verify_url_hint, timeout_ms=10000)
-
-        try:
-            err_loc = page.locator(ERROR_TEXT_CSS).filter(has_text=expected_error_text).first
-            if not err_loc.count():
-                err_loc = page.locator(ERROR_TEXT_CSS).first
-            wait_until_painted(page, err_loc, timeout_ms=5000)
-        except Exception:
-            pass
-
-        if post_assert_delay_ms and post_assert_delay_ms > 0:
-            time.sleep(post_assert_delay_ms / 1000.0)
-
-    # 10) Screenshot
-    stable_screenshot(page, screenshot_path, retries=3, delay_ms=400, full_page=True)
-    print(f"Screenshot saved to {screenshot_path}")
-
-    return observed_error_text
+    return msg
 
 
 # -----------------------------------------------------------------------------
-# Pytest Fixtures (single browser across flows)
+# Pytest Fixtures (one browser per xdist worker, shared by its flows)
 # -----------------------------------------------------------------------------
-@pytest.fixture(scope="session")
-def config():
+def build_config():
     """
     Collect configuration from environment variables (with safe defaults).
+    Reads one snapshot of the environment, so later changes don't leak in.
+    No side effects; a run builds it once through load_shared_config().
+    Raises if an email may be sent but SMTP settings are missing (require_env).
     """
+    env = dict(os.environ)
     cfg = {}
 
     # Browser
-    cfg["HEADLESS"] = os.getenv("HEADLESS", "true").lower() in ("1", "true", "yes")
-    cfg["WINDOW_W"] = int(os.getenv("WINDOW_W", "1920"))
-    cfg["WINDOW_H"] = int(os.getenv("WINDOW_H", "1080"))
+    cfg["HEADLESS"] = _env_flag(env, "HEADLESS", "true")
+    cfg["WINDOW_W"] = _env_int(env, "WINDOW_W", 1920)
+    cfg["WINDOW_H"] = _env_int(env, "WINDOW_H", 1080)
+    # Set BLOCK_THIRD_PARTY=false to debug visuals
+    cfg["BLOCK_THIRD_PARTY"] = _env_flag(env, "BLOCK_THIRD_PARTY", "true")
+    # Optional Playwright channel (e.g. "chrome"); default is the bundled Chromium
+    cfg["BROWSER_CHANNEL"] = env.get("BROWSER_CHANNEL") or None
+    cfg["PW_TIMEOUT_MS"] = _env_int(env, "PW_TIMEOUT_MS", 30000)
+    # PW_TRACE=<zip path> records a lightweight trace to check nothing needed was blocked
+    cfg["PW_TRACE"] = env.get("PW_TRACE") or None
 
     # URLs per flow (override via env)
-    cfg["CS_HK_URL1"] = os.getenv("CS_HK_URL1", "https://www.claimsimple.hk/#/")
-    cfg["TNC_EMC_URL1"] = os.getenv("TNC_EMC_URL1", "https://www.claimsimple.hk/#/tnc")
-    cfg["CS_HK_URL2"] = os.getenv("CS_HK_URL2", "https://www.claimsimple.hk/#/")
-    cfg["TNC_EMC_URL2"] = os.getenv("TNC_EMC_URL2", "https://www.claimsimple.hk/eMedicalCard#")
-    cfg["CS_HK_URL3"] = os.getenv("CS_HK_URL3", "https://www.claimsimple.hk/#/")
-    cfg["TNC_EMC_URL3"] = os.getenv("TNC_EMC_URL3", "https://www.claimsimple.hk/DoctorSearch#/")
+    cfg["CS_HK_URL1"] = env.get("CS_HK_URL1", "https://www.claimsimple.hk/#/")
+    cfg["TNC_EMC_URL1"] = env.get("TNC_EMC_URL1", "https://www.claimsimple.hk/#/tnc")
+    cfg["CS_HK_URL2"] = env.get("CS_HK_URL2", "https://www.claimsimple.hk/#/")
+    cfg["TNC_EMC_URL2"] = env.get("TNC_EMC_URL2", "https://www.claimsimple.hk/eMedicalCard#")
+    cfg["CS_HK_URL3"] = env.get("CS_HK_URL3", "https://www.claimsimple.hk/#/")
+    cfg["TNC_EMC_URL3"] = env.get("TNC_EMC_URL3", "https://www.claimsimple.hk/DoctorSearch#/")
+    # Optional deep links to each flow's ID-entry screen; empty keeps the click path
+    for n in (1, 2, 3):
+        cfg[f"ID_ENTRY_URL{n}"] = env.get(f"ID_ENTRY_URL{n}") or None
+    # Open each TNC_EMC_URL directly instead of splash -> Claim (falls back to clicking)
+    cfg["DIRECT_TNC"] = _env_flag(env, "DIRECT_TNC", "false")
 
     # Inputs (shared)
-    cfg["CLAIM_ID"] = os.getenv("CLAIM_ID", "A0000000")
-    cfg["CLAIM_DOB"] = os.getenv("CLAIM_DOB", "01/01/1990")
+    cfg["CLAIM_ID"] = env.get("CLAIM_ID", "A0000000")
+    cfg["CLAIM_DOB"] = env.get("CLAIM_DOB", "01/01/1990")
 
     # Assertion text
-    cfg["EXPECTED_ERROR_TEXT"] = os.getenv(
+    cfg["EXPECTED_ERROR_TEXT"] = env.get(
         "EXPECTED_ERROR_TEXT",
         "The information you provided does not match our records. Please try again."
     )
+    cfg["EXPECTED_ERROR_NORM"] = normalize_text(cfg["EXPECTED_ERROR_TEXT"])
 
     # Screenshot paths: prefer explicit per-flow env; else derive a timestamped set
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
     default_base = os.path.join("screenshots", f"screenshot_{ts}")
-    cfg["SHOT1"] = os.getenv("SCREENSHOT_PATH1", f"{default_base}_1.png")
-    cfg["SHOT2"] = os.getenv("SCREENSHOT_PATH2", f"{default_base}_2.png")
-    cfg["SHOT3"] = os.getenv("SCREENSHOT_PATH3", f"{default_base}_3.png")
+    cfg["SHOT1"] = env.get("SCREENSHOT_PATH1", f"{default_base}_1.jpg")
+    cfg["SHOT2"] = env.get("SCREENSHOT_PATH2", f"{default_base}_2.jpg")
+    cfg["SHOT3"] = env.get("SCREENSHOT_PATH3", f"{default_base}_3.jpg")
+    # Clip screenshots to the error message; FULL_PAGE_SCREENSHOT=true keeps the whole page
+    cfg["FULL_PAGE_SCREENSHOT"] = _env_flag(env, "FULL_PAGE_SCREENSHOT", "false")
+    # JPEG quality of the screenshots and their downscaled copies
+    cfg["SCREENSHOT_Q"] = _env_int(env, "SCREENSHOT_Q", DEFAULT_JPEG_QUALITY)
 
     # Email controls
-    cfg["SMTP_USERNAME"] = os.getenv("SMTP_USERNAME")
-    cfg["SMTP_PASSWORD"] = os.getenv("SMTP_PASSWORD")
-    cfg["TO_EMAIL"] = os.getenv("TO_EMAIL")
-    cfg["USE_SSL_465"] = os.getenv("USE_SSL_465", "false").lower() in ("1", "true", "yes")
-
-    cfg["ALWAYS_EMAIL"] = os.getenv("ALWAYS_EMAIL", "true").lower() in ("1", "true", "yes")
-    cfg["EMAIL_ON_FAILURE"] = os.getenv("EMAIL_ON_FAILURE", "true").lower() in ("1", "true", "yes")
+    cfg["SMTP_USERNAME"] = env.get("SMTP_USERNAME")
+    cfg["SMTP_PASSWORD"] = env.get("SMTP_PASSWORD")
+    cfg["TO_EMAIL"] = env.get("TO_EMAIL")
+    cfg["USE_SSL_465"] = _env_flag(env, "USE_SSL_465", "false")
+    # Max width (px) of emailed screenshots (MAX_IMAGE_WIDTH is the shared name
+    # across scripts); 0 sends them as captured
+    cfg["EMAIL_IMG_MAX_PX"] = _env_int(env, "EMAIL_IMG_MAX_PX", _env_int(env, "MAX_IMAGE_WIDTH", 1200))
+
+    cfg["ALWAYS_EMAIL"] = _env_flag(env, "ALWAYS_EMAIL", "true")
+    cfg["EMAIL_ON_FAILURE"] = _env_flag(env, "EMAIL_ON_FAILURE", "true")
+    if cfg["ALWAYS_EMAIL"] or cfg["EMAIL_ON_FAILURE"]:
+        # A run that may email fails at startup, not after every flow has run
+        require_env(env)
 
     # Email content
     now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    cfg["SUBJECT_BASE"] = os.getenv("SUBJECT", "GOCC - Health Check - HK eClaims – (0700 HKT)")
+    cfg["SUBJECT_BASE"] = env.get("SUBJECT", "GOCC - Health Check - HK eClaims – (0700 HKT)")
 
     # Global intro (your requested text)
-    cfg["INTRO_HTML"] = os.getenv("INTRO_HTML") or (
+    cfg["INTRO_HTML"] = env.get("INTRO_HTML") or (
         "Hi Team,<br/><br/>Good day!<br/><br/>"
         "We have performed the eClaims health check and no issue encountered."
     )
 
     # Per-flow intros (keep your existing bodies; allow YAML to override)
-    cfg["BODY1"] = os.getenv("BODY1") or (
+    cfg["BODY1"] = env.get("BODY1") or (
         "<strong>OUTPATIENTS CLAIMS:</strong><br/>"
         f"<em>Timestamp: {now_str}</em>"
     )
-    cfg["BODY2"] = os.getenv("BODY2") or (
+    cfg["BODY2"] = env.get("BODY2") or (
         "<strong>MY MEDICAL CARD:</strong><br/>"
         f"<em>Timestamp: {now_str}</em>"
     )
-    cfg["BODY3"] = os.getenv("BODY3") or (
+    cfg["BODY3"] = env.get("BODY3") or (
         "<strong>FIND MY DOCTOR:</strong><br/>"
         f"<em>Timestamp: {now_str}</em>"
     )
@@ -525,148 +352,189 @@ def config():
         "If you can't see them, open in an HTML-capable client."
     )
 
-    cfg["POST_ASSERT_DELAY_MS"] = int(os.getenv("POST_ASSERT_DELAY_MS", "1000"))
-    cfg["VERIFY_URL_HINT"] = os.getenv("VERIFY_URL_HINT", "verify|validate")
+    # Fixed post-assert pause, only applied when SLOW_MODE is set
+    cfg["POST_ASSERT_DELAY_MS"] = _env_int(env, "POST_ASSERT_DELAY_MS", 1000)
+    cfg["SLOW_MODE"] = _env_flag(env, "SLOW_MODE", "false")
+    cfg["VERIFY_URL_HINT"] = env.get("VERIFY_URL_HINT", "verify|validate")
+
+    return cfg
+
+
+RUN_CONFIG_FILE = "run_config.json"
 
+
+def load_shared_config(results_dir) -> dict:
+    """
+    The run's build_config(), built once per run: the first process to get
+    here publishes it as <results_dir>/run_config.json and every other worker
+    (and conftest.py's summary email) reads that file, so timestamps and
+    screenshot paths match across processes.
+    """
+    path = os.path.join(results_dir, RUN_CONFIG_FILE)
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        pass
+    cfg = build_config()
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cfg, f, ensure_ascii=False)
+    try:
+        os.link(tmp, path)  # atomic publish; fails if another worker was first
+    except FileExistsError:
+        with open(path, encoding="utf-8") as f:
+            cfg = json.load(f)
+    finally:
+        os.remove(tmp)
     return cfg
 
 
 @pytest.fixture(scope="session")
-def page(config):
-    """One browser/page used for all three flows."""
+def config(results_dir):
+    cfg = load_shared_config(results_dir)
+    # Create every screenshot directory once per worker, not per screenshot
+    for shot_dir in {os.path.dirname(cfg[k]) for k in ("SHOT1", "SHOT2", "SHOT3")}:
+        if shot_dir:
+            os.makedirs(shot_dir, exist_ok=True)
+    return cfg
+
+
+@pytest.fixture(scope="session")
+def page(config, tmp_path_factory):
+    """
+    One browser/page per worker, reused by every flow it runs.
+    A persistent profile keeps the SPA bundle and HTTP cache warm after the
+    first flow's navigation.
+    """
     with sync_playwright() as p:
-        browser = p.chromium.launch(headless=config["HEADLESS"])
-        context = browser.new_context(
+        context = p.chromium.launch_persistent_context(
+            user_data_dir=str(tmp_path_factory.mktemp("pw-profile")),
+            headless=config["HEADLESS"],
+            channel=config["BROWSER_CHANNEL"],
+            args=CHROMIUM_ARGS,
+            chromium_sandbox=False,
             viewport={"width": config["WINDOW_W"], "height": config["WINDOW_H"]},
             ignore_https_errors=True,
             timezone_id="Asia/Hong_Kong",
             locale="en-HK",
+            bypass_csp=True,
+            java_script_enabled=True,
+            # The SPA's service worker delays first paint and hides requests from context.route
+            service_workers="block",
         )
-        try:
-            context.set_default_timeout(int(os.getenv("PW_TIMEOUT_MS", "30000")))
-        except Exception:
-            pass
-
-        pg = context.new_page()
+        context.set_default_timeout(config["PW_TIMEOUT_MS"])
+        context.add_init_script(script=PAGE_HELPERS_JS)
+
+        if config["BLOCK_THIRD_PARTY"]:
+            # Every flow runs on this page: each one's own host is first party
+            context.route("**/*", make_third_party_blocker(
+                *(config[f"CS_HK_URL{n}"] for n in (1, 2, 3)),
+                *(config[f"TNC_EMC_URL{n}"] for n in (1, 2, 3)),
+            ))
+
+        trace_path = config["PW_TRACE"]
+        if trace_path:
+            context.tracing.start(screenshots=False, snapshots=False)
+
+        # A persistent context starts with one blank page already open
+        pg = context.pages[0] if context.pages else context.new_page()
         yield pg
-        try:
-            context.close()
-        finally:
-            browser.close()
+        if trace_path:
+            context.tracing.stop(path=trace_path)
+        context.close()
 
 
 # -----------------------------------------------------------------------------
-# The single pytest "test" that runs all flows and sends one email
+# One parametrized test per flow; conftest.py sends the single email
 # -----------------------------------------------------------------------------
-def test_all_flows_single_email(page, config):
+# URLs, screenshot path and intro come from config keys suffixed with "n"
+FLOWS = [
+    {
+        "n": 1,
+        "title": "Outpatients Claims",
+        "claim_btn_selector": ".splash__body_search-doctor",
+        "continue_btn_selector": ".button-primary.button-primary--full.button-doctorsearch-continue",
+    },
+    {
+        "n": 2,
+        "title": "My Medical Card",
+        "claim_btn_selector": ".splash__body_get-emedicard",
+        "continue_btn_selector": ".button-primary.button-primary--full.button-emedicalcard-continue",
+    },
+    {
+        "n": 3,
+        "title": "Find My Doctor",
+        "claim_btn_selector": ".splash__body_make-claim",
+        "continue_btn_selector": ".button-primary.button-primary--full.button-doctorsearch-continue",
+    },
+]
+
+
+def write_flow_result(results_dir, result: dict):
+    """Persist one flow's result as <results_dir>/flow_<n>.json (read back by conftest.py)."""
+    os.makedirs(results_dir, exist_ok=True)
+    path = os.path.join(results_dir, f"flow_{result['n']}.json")
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+@pytest.mark.parametrize("flow", FLOWS, ids=[f["title"] for f in FLOWS])
+def test_flow(page, config, flow, results_dir):
     """
-    Runs 3 flows in sequence and sends one email with all results & screenshots.
-    Fails the test at the end if any flow failed.
+    Runs ONE flow and records its result for the single summary email.
+    Fails the test if the flow failed (after the result is written).
     """
-    flows = [
-        {
-            "title": "Outpatients Claims",
-            "cs_hk_url": config["CS_HK_URL1"],
-            "tnc_url": config["TNC_EMC_URL1"],
-            "claim_btn_selector": ".splash__body_search-doctor",
-            "continue_btn_selector": ".button-primary.button-primary--full.button-doctorsearch-continue",
-            "screenshot": config["SHOT1"],
-            "html_intro": config["BODY1"],
-        },
-        {
-            "title": "My Medical Card",
-            "cs_hk_url": config["CS_HK_URL2"],
-            "tnc_url": config["TNC_EMC_URL2"],
-            "claim_btn_selector": ".splash__body_get-emedicard",
-            "continue_btn_selector": ".button-primary.button-primary--full.button-emedicalcard-continue",
-            "screenshot": config["SHOT2"],
-            "html_intro": config["BODY2"],
-        },
-        {
-            "title": "Find My Doctor",
-            "cs_hk_url": config["CS_HK_URL3"],
-            "tnc_url": config["TNC_EMC_URL3"],
-            "claim_btn_selector": ".splash__body_make-claim",
-            "continue_btn_selector": ".button-primary.button-primary--full.button-doctorsearch-continue",
-            "screenshot": config["SHOT3"],
-            "html_intro": config["BODY3"],
-        },
-    ]
-
-    results = []
-    any_fail = False
-
-    for f in flows:
-        observed_error = ""
-        status = "PASSED"
-        failure_reason = None
+    n = flow["n"]
+    screenshot = config[f"SHOT{n}"]
+    observed_error = ""
+    status = "PASSED"
+    failure_reason = None
 
-        try:
-            observed_error = run_claimsimple_flow_playwright(
-                page,
-                cs_hk_url=f["cs_hk_url"],
-                tnc_emc_url=f["tnc_url"],
-                claim_id=config["CLAIM_ID"],
-                claim_dob=config["CLAIM_DOB"],
-                expected_error_text=config["EXPECTED_ERROR_TEXT"],
-                screenshot_path=f["screenshot"],
-                claim_btn_selector=f["claim_btn_selector"],
-                continue_btn_selector=f["continue_btn_selector"],
-                post_assert_delay_ms=config["POST_ASSERT_DELAY_MS"],
-                verify_url_hint=config["VERIFY_URL_HINT"],
-            )
-        except Exception as e:
-            status = "FAILED"
-            any_fail = True
-            failure_reason = str(e)
-            # Best-effort screenshot on failure
-            try:
-                stable_screenshot(page, f["screenshot"], retries=2, delay_ms=300, full_page=True)
-            except Exception:
-                pass
-
-        results.append({
-            "title": f["title"],
-            "status": status,
-            "observed_error": observed_error,
-            "failure_reason": failure_reason,
-            "image_path": f["screenshot"],
-            "image_subtype": "png",
-            "html_intro": f["html_intro"],
-        })
-
-    # ---------------- Send one email (ALWAYS or only on failure) --------------
-    should_email = config["ALWAYS_EMAIL"] or (any_fail and config["EMAIL_ON_FAILURE"])
-    if should_email:
-        subject_status = "FAILED" if any_fail else "PASSED"
-        subject = f"{config['SUBJECT_BASE']} [{subject_status}]"
-
-        # Validate SMTP vars only when needed
-        smtp_user = config["SMTP_USERNAME"] or get_env("SMTP_USERNAME")
-        smtp_pass = config["SMTP_PASSWORD"] or get_env("SMTP_PASSWORD")
-        to_email  = config["TO_EMAIL"] or get_env("TO_EMAIL")
-
-        msg = build_message_with_multiple_images(
-            from_email=smtp_user,
-            to_email=to_email,
-            subject=subject,
-            text_body=config["TEXT_BODY"],
-            intro_html=config["INTRO_HTML"],
-            sections=results,
-        )
-        send_via_gmail_smtp(
-            msg,
-            smtp_user,
-            smtp_pass,
-            use_port_465=config["USE_SSL_465"],
-        )
-        print(f"✅ Single email sent to {to_email} with {len(results)} inline screenshots.")
-
-    # Finally, fail the test if any flow failed (after sending email)
-    if any_fail:
-        failed = [r for r in results if r["status"] == "FAILED"]
-        details = "\n".join(
-            f"- {r['title']}: {r['failure_reason'] or 'Unknown error'}"
-            for r in failed
+    try:
+        observed_error, _ = run_claimsimple_flow_playwright(
+            page,
+            cs_hk_url=config[f"CS_HK_URL{n}"],
+            tnc_emc_url=config[f"TNC_EMC_URL{n}"],
+            claim_id=config["CLAIM_ID"],
+            claim_dob=config["CLAIM_DOB"],
+            expected_error_text=config["EXPECTED_ERROR_TEXT"],
+            expected_error_norm=config["EXPECTED_ERROR_NORM"],
+            screenshot_path=screenshot,
+            claim_btn_selector=flow["claim_btn_selector"],
+            continue_btn_selector=flow["continue_btn_selector"],
+            post_assert_delay_ms=config["POST_ASSERT_DELAY_MS"],
+            slow_mode=config["SLOW_MODE"],
+            verify_url_hint=compile_url_hint(config["VERIFY_URL_HINT"]),
+            full_page_screenshot=config["FULL_PAGE_SCREENSHOT"],
+            id_entry_url=config[f"ID_ENTRY_URL{n}"],
+            direct_tnc=config["DIRECT_TNC"],
+            # Any summary email carries every flow's screenshot, passing or not
+            take_screenshot=config["ALWAYS_EMAIL"] or config["EMAIL_ON_FAILURE"],
+            jpeg_quality=config["SCREENSHOT_Q"],
         )
-        raise AssertionError(f"One or more flows FAILED:\n{details}")
\ No newline at end of file
+    except Exception as e:
+        status = "FAILED"
+        failure_reason = str(e)
+        # Best-effort screenshot on failure
+        try:
+            stable_screenshot(page, screenshot, retries=2, delay_ms=300, full_page=True,
+                              quality=config["SCREENSHOT_Q"])
+        except Exception:
+            pass
+
+    write_flow_result(results_dir, prepare_section({
+        "n": n,
+        "title": flow["title"],
+        "status": status,
+        "observed_error": observed_error,
+        "failure_reason": failure_reason,
+        "image_path": os.path.abspath(screenshot),
+        "image_subtype": screenshot_type(screenshot),
+        "html_intro": config[f"BODY{n}"],
+    }))
+
+    if status == "FAILED":
+        raise AssertionError(f"{flow['title']} FAILED:\n{failure_reason or 'Unknown error'}")
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""
+Config.from_env (single-flow scripts) and hk_eclaims.build_config, from an
+environment snapshot (no browser).
+"""
+
+import pytest
+
+from claimsimple_flow import Config
+from email_utils import DEFAULT_JPEG_QUALITY
+from hk_eclaims import build_config
+
+SMTP_ENV = {"SMTP_USERNAME": "user@example.com", "SMTP_PASSWORD": "secret", "TO_EMAIL": "team@example.com"}
+
+
+@pytest.fixture
+def smtp_env(monkeypatch):
+    for name, value in SMTP_ENV.items():
+        monkeypatch.setenv(name, value)
+
+
+def test_screenshot_quality_comes_from_the_env(smtp_env, monkeypatch):
+    assert Config.from_env({**SMTP_ENV, "SCREENSHOT_Q": "60"}).SCREENSHOT_Q == 60
+    monkeypatch.setenv("SCREENSHOT_Q", "60")
+    assert build_config()["SCREENSHOT_Q"] == 60
+
+
+def test_empty_screenshot_quality_keeps_the_default(smtp_env, monkeypatch):
+    assert Config.from_env({**SMTP_ENV, "SCREENSHOT_Q": ""}).SCREENSHOT_Q == DEFAULT_JPEG_QUALITY
+    monkeypatch.setenv("SCREENSHOT_Q", "")
+    assert build_config()["SCREENSHOT_Q"] == DEFAULT_JPEG_QUALITY
+
+
+def test_playwright_timeout_comes_from_the_snapshot():
+    assert Config.from_env({**SMTP_ENV, "PW_TIMEOUT_MS": "45000"}).PW_TIMEOUT_MS == 45000
+    assert Config.from_env({**SMTP_ENV, "PW_TIMEOUT_MS": ""}).PW_TIMEOUT_MS == 30000
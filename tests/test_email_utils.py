@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+email_utils without a browser or network (the SMTP client is mocked).
+"""
+
+import io
+import os
+import smtplib
+from unittest import mock
+
+import pytest
+
+import email_utils
+from email_utils import SmtpSender, build_message_with_inline_image, get_env, require_env
+
+# 1x1 PNG: enough for add_related, no Pillow needed
+TINY_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+)
+
+
+def _build(**kwargs):
+    args = dict(
+        from_email="from@example.com",
+        to_email="to@example.com",
+        subject="Health check",
+        text_body="text",
+        html_intro="intro",
+        image_path="shot.png",
+        image_bytes=TINY_PNG,
+    )
+    args.update(kwargs)
+    return build_message_with_inline_image(**args)
+
+
+def _image_part(msg):
+    (part,) = [p for p in msg.walk() if p.get_content_maintype() == "image"]
+    return part
+
+
+def _png(width, height=10):
+    Image = pytest.importorskip("PIL.Image")
+    buf = io.BytesIO()
+    Image.new("RGB", (width, height), "white").save(buf, "PNG")
+    return buf.getvalue()
+
+
+def _width(data):
+    Image = pytest.importorskip("PIL.Image")
+    with Image.open(io.BytesIO(data)) as img:
+        return img.width
+
+
+def test_send_reconnects_once_when_the_server_disconnects():
+    msg = _build()
+    with mock.patch("smtplib.SMTP_SSL") as smtp_ssl:
+        dropped, fresh = mock.Mock(), mock.Mock()
+        dropped.send_message.side_effect = smtplib.SMTPServerDisconnected("gone")
+        smtp_ssl.side_effect = [dropped, fresh]
+
+        sender = SmtpSender("user@example.com", "secret", use_port_465=True)
+        sender.send(msg)
+
+    assert smtp_ssl.call_count == 2
+    fresh.login.assert_called_once_with("user@example.com", "secret")
+    fresh.send_message.assert_called_once_with(msg)
+    assert sender._server is fresh
+
+
+def test_send_reuses_a_live_connection():
+    with mock.patch("smtplib.SMTP_SSL") as smtp_ssl:
+        server = smtp_ssl.return_value
+        server.noop.return_value = (250, b"OK")
+
+        sender = SmtpSender("user@example.com", "secret", use_port_465=True)
+        sender.send(_build())
+        sender.send(_build())
+
+    smtp_ssl.assert_called_once()
+    server.noop.assert_called_once()  # not needed before the first send
+    assert server.send_message.call_count == 2
+
+
+def test_each_message_gets_its_own_cid():
+    first, second = _build(), _build()
+    cids = [_image_part(m)["Content-ID"] for m in (first, second)]
+    assert cids[0] != cids[1]
+    for msg, cid in zip((first, second), cids):
+        html = msg.get_body(preferencelist=("html",)).get_content()
+        assert f"cid:{cid[1:-1]}" in html
+
+
+def test_image_file_is_reread_after_it_changes(tmp_path):
+    path = tmp_path / "shot.png"
+    path.write_bytes(_png(3000))
+    first = _image_part(_build(image_path=str(path), image_bytes=None, max_px=1200))
+    assert _width(first.get_content()) == 1200
+
+    path.write_bytes(_png(600))
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    second = _image_part(_build(image_path=str(path), image_bytes=None, max_px=1200))
+    assert _width(second.get_content()) == 600
+
+
+def test_image_bytes_are_downscaled_to_max_px():
+    part = _image_part(_build(image_bytes=_png(3000), max_px=1200))
+    assert _width(part.get_content()) == 1200
+
+
+def test_narrow_image_is_sent_as_captured():
+    data = _png(800)
+    assert _image_part(_build(image_bytes=data, max_px=1200)).get_content() == data
+
+
+def test_image_bytes_are_inlined_with_the_path_as_filename():
+    part = _image_part(_build(image_path=os.path.join("screenshots", "shot.png")))
+    assert part.get_content() == TINY_PNG
+    assert part.get_filename() == "shot.png"
+    assert part.get_content_subtype() == "png"
+
+
+def test_get_env_checks_only_the_requested_var(monkeypatch):
+    for name in email_utils.REQUIRED_VARS:
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("SMTP_USERNAME", "user@example.com")
+    assert get_env("SMTP_USERNAME") == "user@example.com"
+    with pytest.raises(RuntimeError, match="TO_EMAIL"):
+        get_env("TO_EMAIL")
+
+
+def test_require_env_lists_every_missing_var():
+    with pytest.raises(RuntimeError, match="SMTP_PASSWORD, TO_EMAIL"):
+        require_env({"SMTP_USERNAME": "user@example.com", "TO_EMAIL": ""})
+    env = {"SMTP_USERNAME": "u", "SMTP_PASSWORD": "p", "TO_EMAIL": "t"}
+    assert require_env(env) == env
+
+
+def test_downscaled_jpeg_uses_the_given_quality():
+    Image = pytest.importorskip("PIL.Image")
+    buf = io.BytesIO()
+    Image.radial_gradient("L").resize((3000, 300)).convert("RGB").save(buf, "JPEG", quality=95)
+    sizes = [
+        len(_image_part(_build(image_bytes=buf.getvalue(), image_subtype="jpeg", max_px=1200,
+                               jpeg_quality=q)).get_content())
+        for q in (30, 95)
+    ]
+    assert sizes[0] < sizes[1]
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+conftest.py's per-flow result aggregation and summary email, on a temp
+results directory (no browser, the SMTP sender is faked).
+"""
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import conftest
+import email_utils
+from hk_eclaims import RUN_CONFIG_FILE, load_shared_config, write_flow_result
+
+
+@pytest.fixture
+def smtp_env(monkeypatch):
+    monkeypatch.setenv("SMTP_USERNAME", "user@example.com")
+    monkeypatch.setenv("SMTP_PASSWORD", "secret")
+    monkeypatch.setenv("TO_EMAIL", "team@example.com")
+
+
+@pytest.fixture
+def results_dir(tmp_path, monkeypatch, smtp_env):
+    monkeypatch.setenv(conftest.RESULTS_DIR_ENV, str(tmp_path))
+    return tmp_path
+
+
+def _result(n, status="PASSED"):
+    return {
+        "n": n,
+        "title": f"Flow {n}",
+        "status": status,
+        "observed_error": "",
+        "failure_reason": None if status == "PASSED" else "boom",
+        "image_path": f"missing_{n}.png",  # no file: the section is sent without an image
+        "image_subtype": "png",
+        "html_intro": "",
+    }
+
+
+class FakeSender:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.sent = []
+
+    def ensure_connected(self):
+        pass
+
+    def send(self, msg):
+        if self.fail:
+            raise OSError("SMTP down")
+        self.sent.append(msg)
+
+
+def _finish(monkeypatch, sender):
+    monkeypatch.setattr(email_utils, "get_sender", lambda *args, **kwargs: sender)
+    session = SimpleNamespace(config=SimpleNamespace(), exitstatus=pytest.ExitCode.OK)
+    conftest.pytest_sessionfinish(session, session.exitstatus)
+    return session
+
+
+def test_load_flow_results_in_flow_order(results_dir):
+    for n in (3, 1, 2):
+        write_flow_result(results_dir, _result(n))
+    load_shared_config(results_dir)
+    (results_dir / "flow_4.json.tmp").write_text("{}", encoding="utf-8")
+
+    assert [r["n"] for r in conftest.load_flow_results(results_dir)] == [1, 2, 3]
+
+
+def test_load_shared_config_is_built_once(results_dir, monkeypatch):
+    first = load_shared_config(results_dir)
+    monkeypatch.setenv("SUBJECT", "changed after the first worker")
+    assert load_shared_config(results_dir) == first
+    assert json.loads((results_dir / RUN_CONFIG_FILE).read_text(encoding="utf-8")) == first
+
+
+def test_summary_email_covers_every_flow(results_dir, monkeypatch):
+    load_shared_config(results_dir)
+    write_flow_result(results_dir, _result(1))
+    write_flow_result(results_dir, _result(2, "FAILED"))
+    sender = FakeSender()
+
+    session = _finish(monkeypatch, sender)
+
+    (msg,) = sender.sent
+    assert msg["Subject"].endswith("[FAILED]")
+    assert msg["To"] == "team@example.com"
+    html = msg.get_body(preferencelist=("html",)).get_content()
+    assert "Flow 1" in html and "Flow 2" in html
+    assert session.exitstatus == pytest.ExitCode.OK
+
+
+def test_failed_summary_email_fails_the_run(results_dir, monkeypatch):
+    load_shared_config(results_dir)
+    write_flow_result(results_dir, _result(1))
+
+    session = _finish(monkeypatch, FakeSender(fail=True))
+
+    assert session.exitstatus == pytest.ExitCode.TESTS_FAILED
+
+
+def test_no_flow_results_sends_nothing(results_dir, monkeypatch):
+    sender = FakeSender()
+    assert _finish(monkeypatch, sender).exitstatus == pytest.ExitCode.OK
+    assert sender.sent == []
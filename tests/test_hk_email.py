@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+hk_eclaims' multi-image summary email, built from screenshot files on disk
+(no browser, nothing is sent).
+"""
+
+import pytest
+
+from hk_eclaims import build_message_with_multiple_images
+
+# 1x1 PNG: enough for add_related, no Pillow needed
+TINY_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+)
+
+
+def _build(sections, **kwargs):
+    return build_message_with_multiple_images(
+        from_email="from@example.com",
+        to_email="to@example.com",
+        subject="Health check",
+        text_body="text",
+        intro_html="intro",
+        sections=sections,
+        **kwargs,
+    )
+
+
+def _images(msg):
+    return [p for p in msg.walk() if p.get_content_maintype() == "image"]
+
+
+def test_screenshot_files_are_inlined_and_serialize(tmp_path):
+    sections = []
+    for n in (1, 2):
+        path = tmp_path / f"shot_{n}.png"
+        path.write_bytes(TINY_PNG)
+        sections.append({"title": f"Flow {n}", "status": "PASSED", "image_path": str(path)})
+    sections.append({"title": "Flow 3", "status": "FAILED", "image_path": str(tmp_path / "missing.png")})
+
+    msg = _build(sections)
+
+    images = _images(msg)
+    assert [p.get_filename() for p in images] == ["shot_1.png", "shot_2.png"]
+    assert all(p.get_content() == TINY_PNG for p in images)
+    assert b"Content-ID: <shot2@inline>" in msg.as_bytes()
+
+
+def _png(tmp_path, name, width):
+    Image = pytest.importorskip("PIL.Image")
+    path = tmp_path / name
+    Image.new("RGB", (width, 10), "white").save(path, "PNG")
+    return path
+
+
+def test_only_screenshots_wider_than_the_budget_are_recompressed(tmp_path):
+    narrow, wide = _png(tmp_path, "narrow.png", 800), _png(tmp_path, "wide.png", 3000)
+    sections = [
+        {"title": "Narrow", "status": "PASSED", "image_path": str(narrow)},
+        {"title": "Wide", "status": "PASSED", "image_path": str(wide)},
+    ]
+
+    kept, shrunk = _images(_build(sections, image_max_px=1200))
+
+    assert kept.get_content() == narrow.read_bytes()
+    assert kept.get_content_subtype() == "png"
+    assert (shrunk.get_filename(), shrunk.get_content_subtype()) == ("wide.jpg", "jpeg")